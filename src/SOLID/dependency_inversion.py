@@ -36,7 +36,7 @@ class Relationships(RelationshipBrowser):
 
     def add_parrent_and_child(self, parent: Person, child: Person) -> None:
         self.relations.append((parent, Relationship.PARENT, child))
-        self.relations.append((child, Relationship.CHILD, child))
+        self.relations.append((child, Relationship.CHILD, parent))
 
     # if internal storage (self.relations) change, rewrite this method
     # and client code will still work
@@ -46,9 +46,31 @@ class Relationships(RelationshipBrowser):
                 yield r[2]
 
 
+# another low level module: forward (parent -> children) and reverse
+# (child -> parents) adjacency lists make a lookup cost O(number of results)
+# instead of a scan of all relations
+class IndexedRelationships(RelationshipBrowser):
+    children: dict[Person, list[Person]]
+    parents: dict[Person, list[Person]]
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.parents = {}
+
+    def add_parrent_and_child(self, parent: Person, child: Person) -> None:
+        self.children.setdefault(parent, []).append(child)
+        self.parents.setdefault(child, []).append(parent)
+
+    def find_all_children(self, parent: Person) -> Generator[Person, None, None]:
+        yield from self.children.get(parent, ())
+
+    def find_all_parents(self, child: Person) -> Generator[Person, None, None]:
+        yield from self.parents.get(child, ())
+
+
 # high level modules
 class Research:
-    def __init__(self, relationships: Relationships, parent: Person) -> None:
+    def __init__(self, relationships: RelationshipBrowser, parent: Person) -> None:
 
         # # WRONG: high level module accesses internal storage mechanism of
         # # low level module
@@ -69,3 +91,9 @@ relationships = Relationships()
 relationships.add_parrent_and_child(john, chris)
 relationships.add_parrent_and_child(john, matt)
 research = Research(relationships, john)
+
+# the high level module works unchanged with another low level module
+indexed_relationships = IndexedRelationships()
+indexed_relationships.add_parrent_and_child(john, chris)
+indexed_relationships.add_parrent_and_child(john, matt)
+research = Research(indexed_relationships, john)
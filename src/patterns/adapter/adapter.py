@@ -1,8 +1,24 @@
-from typing import Iterator
+import mmap
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
+from typing import Iterator, TextIO
+
+import numpy as np
+import numpy.typing as npt
+
+# (N, 2) array of x, y pixel coordinates
+XyArray = npt.NDArray[np.int_]
 
 
 # we are given this API, let's call it Xy
 class XyPoint:
+    __slots__ = ("x", "y")
     x: int
     y: int
 
@@ -18,6 +34,7 @@ def draw_xy_point(p: XyPoint) -> None:
 
 # we use this API
 class Point:
+    __slots__ = ("x", "y")
     x: int
     y: int
 
@@ -27,6 +44,7 @@ class Point:
 
 
 class Line:
+    __slots__ = ("start", "end")
     start: Point
     end: Point
 
@@ -36,6 +54,7 @@ class Line:
 
 
 class Rectangle(list[Line]):
+    __slots__ = ()
     x: int
     y: int
     width: int
@@ -59,6 +78,121 @@ class Rectangle(list[Line]):
         self.append(Line(Point(x, y + height), Point(x + width, y + height)))
 
 
+# compact geometry: lines stored as parallel int columns (struct of arrays) instead of
+# one Line and two Point objects per segment
+class GeometryStore:
+    x0: "array[int]"
+    y0: "array[int]"
+    x1: "array[int]"
+    y1: "array[int]"
+
+    def __init__(self, lines: Iterable[Line] = ()) -> None:
+        self.x0 = array("i")
+        self.y0 = array("i")
+        self.x1 = array("i")
+        self.y1 = array("i")
+        self.extend(lines)
+
+    def __len__(self) -> int:
+        return len(self.x0)
+
+    def __getitem__(self, index: int) -> "LineView":
+        if not -len(self) <= index < len(self):
+            raise IndexError("line index out of range")
+        return LineView(self, index % len(self))
+
+    def __iter__(self) -> Iterator["LineView"]:
+        for i in range(len(self)):
+            yield LineView(self, i)
+
+    def append(self, line: Line) -> int:
+        self.x0.append(line.start.x)
+        self.y0.append(line.start.y)
+        self.x1.append(line.end.x)
+        self.y1.append(line.end.y)
+        return len(self) - 1
+
+    def extend(self, lines: Iterable[Line]) -> range:
+        start = len(self)
+        for line in lines:
+            self.append(line)
+        return range(start, len(self))
+
+    # (N, 4) copy of x0, y0, x1, y1 columns
+    def coords(self) -> XyArray:
+        return np.stack(
+            [np.frombuffer(c, dtype=np.intc) for c in self.__columns()], axis=1
+        )
+
+    # bulk transform working directly on the column buffers
+    def translate(self, dx: int, dy: int) -> None:
+        x0, y0, x1, y1 = (np.frombuffer(c, dtype=np.intc) for c in self.__columns())
+        x0 += dx
+        y0 += dy
+        x1 += dx
+        y1 += dy
+
+    def __columns(self) -> tuple["array[int]", ...]:
+        return (self.x0, self.y0, self.x1, self.y1)
+
+
+# lightweight Line view over a row of GeometryStore; points are read from and written to
+# the columns, so they must be assigned as a whole
+class LineView(Line):
+    __slots__ = ("store", "index")
+    store: GeometryStore
+    index: int
+
+    def __init__(self, store: GeometryStore, index: int) -> None:
+        self.store = store
+        self.index = index
+
+    @property
+    def start(self) -> Point:
+        return Point(self.store.x0[self.index], self.store.y0[self.index])
+
+    @start.setter
+    def start(self, point: Point) -> None:
+        self.store.x0[self.index] = point.x
+        self.store.y0[self.index] = point.y
+
+    @property
+    def end(self) -> Point:
+        return Point(self.store.x1[self.index], self.store.y1[self.index])
+
+    @end.setter
+    def end(self, point: Point) -> None:
+        self.store.x1[self.index] = point.x
+        self.store.y1[self.index] = point.y
+
+
+# integer rasterizer (Bresenham) for lines of any slope; points are emitted along the
+# major axis in increasing order and the end point is excluded, so horizontal and
+# vertical lines cover [min, max) of their coordinates
+def bresenham(line: Line) -> Iterator[tuple[int, int]]:
+    x0, y0, x1, y1 = line.start.x, line.start.y, line.end.x, line.end.y
+
+    # rasterize steep lines with swapped axes
+    steep = abs(y1 - y0) > abs(x1 - x0)
+    if steep:
+        x0, y0, x1, y1 = y0, x0, y1, x1
+    if x0 > x1:
+        x0, y0, x1, y1 = x1, y1, x0, y0
+
+    dx = x1 - x0
+    dy = abs(y1 - y0)
+    ystep = 1 if y0 < y1 else -1
+    # error starts at half a pixel, i.e. the minor coordinate is rounded half up
+    error = dx
+    y = y0
+    for x in range(x0, x1):
+        yield (y, x) if steep else (x, y)
+        error += 2 * dy
+        if error >= 2 * dx:
+            y += ystep
+            error -= 2 * dx
+
+
 # we need to build in-between component, i.e. adapter
 # here we need to represent Line as list of XyPoints
 # because we can only draw XyPoints and not Points, Lines or Rectangles
@@ -66,71 +200,442 @@ class LineToXyPoint(list[XyPoint]):
     def __init__(self, line: Line) -> None:
         super().__init__()
 
-        # compute l,r,t,b coordinates of line
-        # we assume that lines are either horizontal or vertical
-        left = min(line.start.x, line.end.x)
-        right = max(line.start.x, line.end.x)
-        top = min(line.start.y, line.end.y)
-        bottom = max(line.start.y, line.end.y)
+        for x, y in bresenham(line):
+            self.append(XyPoint(x, y))
+
+
+# closed form of the bresenham error term: minor offset rounded half up; arguments
+# describe lines normalized to start at the lower end of their major axis, per point or
+# broadcast
+def _rasterize(
+    x0: XyArray | int,
+    y0: XyArray | int,
+    steep: npt.NDArray[np.bool_] | bool,
+    minor: XyArray | int,
+    lengths: XyArray | int,
+    offsets: XyArray,
+) -> XyArray:
+    minor_offsets = np.sign(minor) * (
+        (2 * offsets * np.abs(minor) + lengths)
+        // np.maximum(2 * np.asarray(lengths), 1)
+    )
+
+    points = np.empty((len(offsets), 2), dtype=np.int_)
+    points[:, 0] = x0 + np.where(steep, minor_offsets, offsets)
+    points[:, 1] = y0 + np.where(steep, offsets, minor_offsets)
+    return points
+
+
+# (M, 4) array of x0, y0, x1, y1 line coordinates
+def lines_to_coords(lines: Iterable[Line]) -> XyArray:
+    if isinstance(lines, GeometryStore):
+        return lines.coords().astype(np.int_)
+    return np.array(
+        [(line.start.x, line.start.y, line.end.x, line.end.y) for line in lines],
+        dtype=np.int_,
+    ).reshape(-1, 4)
+
+
+# rasterize (M, 4) line coordinates; with a window (left, top, right, bottom) only the
+# part of every line whose major coordinate falls inside the window is rasterized
+def coords_to_xy_array(
+    coords: XyArray, window: tuple[int, int, int, int] | None = None
+) -> XyArray:
+    dx = coords[:, 2] - coords[:, 0]
+    dy = coords[:, 3] - coords[:, 1]
+    steep = np.abs(dy) > np.abs(dx)
+
+    # start every line at the lower end of its major axis
+    flip = np.where(steep, dy < 0, dx < 0)
+    x0 = np.where(flip, coords[:, 2], coords[:, 0])
+    y0 = np.where(flip, coords[:, 3], coords[:, 1])
+    dx = np.where(flip, -dx, dx)
+    dy = np.where(flip, -dy, dy)
+
+    lengths = np.where(steep, dy, dx)
+    minor = np.where(steep, dx, dy)
+
+    starts = np.zeros_like(lengths)
+    stops = lengths
+    if window is not None:
+        left, top, right, bottom = window
+        major = np.where(steep, y0, x0)
+        starts = np.clip(np.where(steep, top, left) - major, 0, lengths)
+        stops = np.clip(np.where(steep, bottom, right) - major, starts, lengths)
+    counts = stops - starts
+
+    # index of the line every point belongs to and offset of the point along that line
+    owner = np.repeat(np.arange(len(coords)), counts)
+    offsets = (
+        np.arange(counts.sum())
+        - np.repeat(np.cumsum(counts) - counts, counts)
+        + starts[owner]
+    )
+
+    return _rasterize(
+        x0[owner], y0[owner], steep[owner], minor[owner], lengths[owner], offsets
+    )
+
+
+# vectorization optimization: adapt many lines at once into a single (N, 2) array
+# instead of allocating one XyPoint per pixel; produces the same points as bresenham()
+def lines_to_xy_array(lines: Iterable[Line]) -> XyArray:
+    return coords_to_xy_array(lines_to_coords(lines))
+
+
+# vectorized adapter: represents Line (or all lines of a Rectangle) as an (N, 2) array,
+# but can still be iterated as XyPoints by clients of the Xy API
+class LineToXyArray:
+    points: XyArray
+
+    def __init__(self, line: Line | Rectangle) -> None:
+        self.points = lines_to_xy_array(line if isinstance(line, Rectangle) else [line])
+
+    def __len__(self) -> int:
+        return len(self.points)
 
-        # if line is vertical
-        if right - left == 0:
-            for y in range(top, bottom):
-                self.append(XyPoint(left, y))
-        # if line is horizontal
-        if bottom - top == 0:
-            for x in range(left, right):
-                self.append(XyPoint(x, top))
+    def __iter__(self) -> Iterator[XyPoint]:
+        for x, y in self.points.tolist():
+            yield XyPoint(x, y)
+
+
+# memoization optimization: cache adapted lines by their coordinates, so that equal
+# lines share an entry; least recently used entries are evicted once the budget is
+# exceeded
+LineKey = tuple[int, int, int, int]
+
+
+class LineAdapterCache:
+    max_entries: int | None
+    max_bytes: int | None
+    nbytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(
+        self, max_entries: int | None = 1024, max_bytes: int | None = None
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries: OrderedDict[LineKey, XyArray] = OrderedDict()
+        self.__lock = Lock()
+
+    @staticmethod
+    def key(line: Line) -> LineKey:
+        return (line.start.x, line.start.y, line.end.x, line.end.y)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, line: Line) -> bool:
+        return self.key(line) in self.__entries
+
+    def get(self, line: Line) -> XyArray | None:
+        key = self.key(line)
+        with self.__lock:
+            points = self.__entries.get(key)
+            if points is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return points
+
+    def put(self, line: Line, points: XyArray) -> None:
+        # cached arrays are shared between adapters, so they must not be mutated
+        points.flags.writeable = False
+        key = self.key(line)
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self.__entries[key] = points
+            self.nbytes += points.nbytes
+            self.__evict()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.nbytes = 0
+
+    def __evict(self) -> None:
+        while self.__entries and (
+            (self.max_entries is not None and len(self.__entries) > self.max_entries)
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            _, points = self.__entries.popitem(last=False)
+            self.nbytes -= points.nbytes
+            self.evictions += 1
 
 
-# memoization optimization: cache adapters for encountered lines
 class LineToXyPointCache:
-    cache: dict[int, list[XyPoint]] = {}
+    cache: LineAdapterCache = LineAdapterCache()
+    points: XyArray
 
     def __init__(self, line: Line) -> None:
         super().__init__()
 
-        self.hash = hash(line)
-        if self.hash in self.cache:
+        points = self.cache.get(line)
+        if points is not None:
             print("Line adapter found in cache")
-            return
-
-        print("Creating line adapter")
-        # compute l,r,t,b coordinates of line
-        # we assume that lines are either horizontal or vertical
-        left = min(line.start.x, line.end.x)
-        right = max(line.start.x, line.end.x)
-        top = min(line.start.y, line.end.y)
-        bottom = max(line.start.y, line.end.y)
-
-        points: list[XyPoint] = []
-        # if line is vertical
-        if right - left == 0:
-            for y in range(top, bottom):
-                points.append(XyPoint(left, y))
-        # if line is horizontal
-        if bottom - top == 0:
-            for x in range(left, right):
-                points.append(XyPoint(x, top))
-
-        self.cache[self.hash] = points
+        else:
+            print("Creating line adapter")
+            points = lines_to_xy_array([line])
+            self.cache.put(line, points)
+        self.points = points
 
     def __iter__(self) -> Iterator[XyPoint]:
-        return iter(self.cache[self.hash])
+        for x, y in self.points.tolist():
+            yield XyPoint(x, y)
+
 
+# streaming adapter: yields XyPoints on demand instead of building the whole list up
+# front, so memory use doesn't depend on the length of the line
+class LineToXyPointStream:
+    line: Line
+
+    def __init__(self, line: Line) -> None:
+        self.line = line
+
+    def __iter__(self) -> Iterator[XyPoint]:
+        for x, y in bresenham(self.line):
+            yield XyPoint(x, y)
+
+
+# streaming counterpart of lines_to_xy_array: yields (N, 2) arrays of at most chunk_size
+# points, computed only when the chunk is requested
+def iter_xy_chunks(lines: Iterable[Line], chunk_size: int = 65536) -> Iterator[XyArray]:
+    for line in lines:
+        x0, y0 = line.start.x, line.start.y
+        dx, dy = line.end.x - x0, line.end.y - y0
+        steep = abs(dy) > abs(dx)
+        if (dy if steep else dx) < 0:
+            x0, y0, dx, dy = line.end.x, line.end.y, -dx, -dy
+        length, minor = (dy, dx) if steep else (dx, dy)
+
+        for start in range(0, length, chunk_size):
+            offsets = np.arange(start, min(start + chunk_size, length))
+            yield _rasterize(x0, y0, steep, minor, length, offsets)
+
+
+# write points into a 2D uint8 framebuffer and return how many were written; points
+# outside the framebuffer are clipped, pixels shared by several points are simply
+# written again, which is far cheaper than deduplicating the points
+def plot_xy_array(
+    pixels: npt.NDArray[np.uint8], points: XyArray, value: int = 1
+) -> int:
+    height, width = pixels.shape
+    inside = (
+        (points[:, 0] >= 0)
+        & (points[:, 0] < width)
+        & (points[:, 1] >= 0)
+        & (points[:, 1] < height)
+    )
+    points = points[inside]
+    pixels[points[:, 1], points[:, 0]] = value
+    return len(points)
+
+
+# output optimization: instead of printing every point, adapters write to a sink that
+# decides how (and how often) points reach their destination
+class PointSink(ABC):
+    @abstractmethod
+    def draw_points(self, points: XyArray) -> None:
+        pass
+
+    def draw_point(self, point: XyPoint) -> None:
+        self.draw_points(np.array([[point.x, point.y]], dtype=np.int_))
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+# discards points, but counts them; measures adapter cost without any output cost
+class NullPointSink(PointSink):
+    count: int
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def draw_points(self, points: XyArray) -> None:
+        self.count += len(points)
+
+
+# buffers points in a framebuffer and writes all rows with a single write on flush
+class TextPointSink(PointSink):
+    pixels: npt.NDArray[np.uint8]
+    output: TextIO
+    char: str
+
+    def __init__(
+        self, width: int, height: int, output: TextIO | None = None, char: str = "."
+    ) -> None:
+        self.pixels = np.zeros((height, width), dtype=np.uint8)
+        self.output = output if output is not None else sys.stdout
+        self.char = char
+
+    def draw_points(self, points: XyArray) -> None:
+        plot_xy_array(self.pixels, points)
+
+    def flush(self) -> None:
+        rows = np.where(self.pixels != 0, ord(self.char), ord(" ")).astype(np.uint8)
+        newlines = np.full((len(rows), 1), ord("\n"), dtype=np.uint8)
+        self.output.write(np.hstack((rows, newlines)).tobytes().decode("ascii"))
+        self.output.flush()
+        self.pixels[:] = 0
+
+
+# framebuffer backed by a memory-mapped file of width * height bytes, one byte per pixel
+class MmapPointSink(PointSink):
+    pixels: npt.NDArray[np.uint8]
+
+    def __init__(self, path: str, width: int, height: int) -> None:
+        with open(path, "w+b") as f:
+            f.truncate(width * height)
+            self.__mmap = mmap.mmap(f.fileno(), width * height)
+        self.pixels = np.frombuffer(self.__mmap, dtype=np.uint8).reshape(height, width)
+
+    def draw_points(self, points: XyArray) -> None:
+        plot_xy_array(self.pixels, points)
+
+    def flush(self) -> None:
+        self.__mmap.flush()
+
+    def close(self) -> None:
+        self.flush()
+        # the view must be released before the map can be closed
+        del self.pixels
+        self.__mmap.close()
+
+
+def draw_line(line: Line, stream: bool = False, sink: PointSink | None = None) -> None:
+    if sink is not None:
+        chunks = iter_xy_chunks([line]) if stream else iter([lines_to_xy_array([line])])
+        for chunk in chunks:
+            sink.draw_points(chunk)
+        return
 
-def draw_line(line: Line) -> None:
     # LineToXyPoint adapter adapts line drawing interface to point drawing interface
     # adapter = LineToXyPoint(line)
-    adapter = LineToXyPointCache(line)
+    adapter: Iterable[XyPoint]
+    if stream:
+        adapter = LineToXyPointStream(line)
+    else:
+        adapter = LineToXyPointCache(line)
     for point in adapter:
         draw_xy_point(point)
     print()
 
 
-def draw_rectangle(rectangle: Rectangle) -> None:
+def draw_rectangle(
+    rectangle: Rectangle, stream: bool = False, sink: PointSink | None = None
+) -> None:
     for line in rectangle:
-        draw_line(line)
+        draw_line(line, stream, sink)
+
+
+# batch rendering: rasterize all rectangles straight into a preallocated framebuffer,
+# i.e. a bytearray of rows of the given width or a 2D uint8 array; returns the number of
+# points written, pixels outside the framebuffer are clipped
+def draw_rectangles(
+    rectangles: Iterable[Rectangle],
+    framebuffer: bytearray | npt.NDArray[np.uint8],
+    width: int | None = None,
+    value: int = 1,
+) -> int:
+    if isinstance(framebuffer, np.ndarray):
+        pixels = framebuffer
+    else:
+        if width is None:
+            raise ValueError("width is required for a bytearray framebuffer")
+        pixels = np.frombuffer(framebuffer, dtype=np.uint8).reshape(-1, width)
+
+    points = lines_to_xy_array(line for rectangle in rectangles for line in rectangle)
+    return plot_xy_array(pixels, points, value)
+
+
+# worker of draw_rectangles_parallel(): rasterizes lines clipped to one tile straight
+# into the shared framebuffer; tiles don't overlap, so workers never write the same
+# pixel
+def _draw_tile(
+    shm_name: str,
+    shape: tuple[int, int],
+    tile: tuple[int, int, int, int],
+    coords: XyArray,
+    value: int,
+) -> int:
+    shm = SharedMemory(name=shm_name)
+    try:
+        pixels = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        left, top, right, bottom = tile
+        points = coords_to_xy_array(coords, tile) - (left, top)
+        count = plot_xy_array(pixels[top:bottom, left:right], points, value)
+        del pixels
+        return count
+    finally:
+        shm.close()
+
+
+# parallel batch rendering: the canvas is split into tiles, every line is sent to the
+# tiles its bounding box overlaps and tiles are rasterized by a process pool into a
+# shared-memory framebuffer; the result is the same as draw_rectangles() into a (height,
+# width) array
+def draw_rectangles_parallel(
+    rectangles: Iterable[Rectangle],
+    width: int,
+    height: int,
+    tile_size: int = 256,
+    max_workers: int | None = None,
+    value: int = 1,
+) -> npt.NDArray[np.uint8]:
+    coords = lines_to_coords(line for rectangle in rectangles for line in rectangle)
+    min_x = np.minimum(coords[:, 0], coords[:, 2])
+    max_x = np.maximum(coords[:, 0], coords[:, 2])
+    min_y = np.minimum(coords[:, 1], coords[:, 3])
+    max_y = np.maximum(coords[:, 1], coords[:, 3])
+
+    shm = SharedMemory(create=True, size=max(width * height, 1))
+    try:
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = []
+            for top in range(0, height, tile_size):
+                bottom = min(top + tile_size, height)
+                for left in range(0, width, tile_size):
+                    right = min(left + tile_size, width)
+                    overlaps = (
+                        (max_x >= left)
+                        & (min_x < right)
+                        & (max_y >= top)
+                        & (min_y < bottom)
+                    )
+                    if overlaps.any():
+                        tile = (left, top, right, bottom)
+                        futures.append(
+                            executor.submit(
+                                _draw_tile,
+                                shm.name,
+                                (height, width),
+                                tile,
+                                coords[overlaps],
+                                value,
+                            )
+                        )
+            for future in futures:
+                future.result()
+
+        pixels = np.ndarray((height, width), dtype=np.uint8, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return pixels
 
 
 if __name__ == "__main__":
@@ -140,3 +645,9 @@ if __name__ == "__main__":
     ]
     draw_rectangle(rectangles[0])
     draw_rectangle(rectangles[0])
+    draw_rectangle(rectangles[1], stream=True)
+
+    sink = TextPointSink(12, 12)
+    for rectangle in rectangles:
+        draw_rectangle(rectangle, sink=sink)
+    sink.close()
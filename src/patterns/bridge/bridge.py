@@ -1,29 +1,248 @@
 from abc import ABC
+from collections import OrderedDict
+from collections.abc import Iterable
+
+import numpy as np
+import numpy.typing as npt
+
+FloatArray = npt.NDArray[np.float64]
+
+# pixel box: left, top, right, bottom (right and bottom exclusive)
+Box = tuple[int, int, int, int]
+
 
 # Implementor defines the interface for implementation classes
 class Renderer(ABC):
-    def render_circle(self, radius: float) -> None:
+    def render_circle(
+        self, radius: float, center: tuple[float, float] = (0, 0)
+    ) -> None:
         pass
 
+    # batch interface: one call for many circles; centers is an (N, 2) array of x, y and
+    # radii an (N,) array; implementors that can't batch fall back to one call per
+    # circle
+    def render_circles(self, centers: npt.ArrayLike, radii: npt.ArrayLike) -> None:
+        c = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        r = np.asarray(radii, dtype=np.float64).ravel()
+        for (x, y), radius in zip(c.tolist(), r.tolist()):
+            self.render_circle(radius, (x, y))
+
+    # renderers that keep what they drew, e.g. in a pixel buffer, are retained: a
+    # changed shape has to be erased from them before it is drawn again
+    retained: bool = False
+
+    # erases the given box, or everything for None
+    def erase(self, box: Box | None) -> None:
+        pass
+
+    # box a rendered circle covers, None if unknown
+    def circle_box(self, center: tuple[float, float], radius: float) -> Box | None:
+        return None
+
     # def render_square(self, width: float, height: float) -> None:
     #     pass
 
 
 # ConcreteImplementor
 class VectorRenderer(Renderer):
-    def render_circle(self, radius: float) -> None:
+    def render_circle(
+        self, radius: float, center: tuple[float, float] = (0, 0)
+    ) -> None:
         print(f"draw vector circle of radius {radius}")
 
 
+# rasterized circle outline centered in a (2 * half + 1) square, half = ceil(radius +
+# 0.5)
+def rasterize_circle(radius: float) -> npt.NDArray[np.uint8]:
+    half = int(np.ceil(radius + 0.5))
+    offsets = np.arange(-half, half + 1)
+    distance = np.hypot(offsets[np.newaxis, :], offsets[:, np.newaxis])
+    sprite: npt.NDArray[np.uint8] = (np.abs(distance - radius) <= 0.5).astype(np.uint8)
+    return sprite
+
+
+# caches rasterized circles (sprites) by radius quantized to multiples of step; least
+# recently used sprites are evicted once their total size exceeds max_bytes
+class CircleSpriteCache:
+    step: float
+    max_bytes: int
+    nbytes: int
+    hits: int
+    misses: int
+    evictions: int
+    sprites: OrderedDict[int, npt.NDArray[np.uint8]]
+
+    def __init__(self, step: float = 1.0, max_bytes: int = 1 << 20) -> None:
+        self.step = step
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.sprites = OrderedDict()
+
+    def key(self, radius: float) -> int:
+        return round(radius / self.step)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, radius: float) -> npt.NDArray[np.uint8]:
+        key = self.key(radius)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        self.misses += 1
+        sprite = rasterize_circle(key * self.step)
+        self.sprites[key] = sprite
+        self.nbytes += sprite.nbytes
+        while self.nbytes > self.max_bytes and len(self.sprites) > 1:
+            _, evicted = self.sprites.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+        return sprite
+
+    # a sprite depends only on its quantized radius, so sprites go stale only when the
+    # quantization step changes; dropped sprites count as evictions
+    def set_step(self, step: float) -> None:
+        self.step = step
+        self.evictions += len(self.sprites)
+        self.sprites.clear()
+        self.nbytes = 0
+
+
 # ConcreteImplementor
 class RasterRenderer(Renderer):
-    def render_circle(self, radius: float) -> None:
+    pixels: npt.NDArray[np.uint8]
+    sprites: CircleSpriteCache | None
+    retained = True
+
+    # upper bound on the candidate pixels rasterized at once
+    max_pixels: int = 1 << 20
+
+    def __init__(
+        self,
+        width: int = 64,
+        height: int = 64,
+        sprites: CircleSpriteCache | None = None,
+    ) -> None:
+        self.pixels = np.zeros((height, width), dtype=np.uint8)
+        self.sprites = sprites
+
+    def render_circle(
+        self, radius: float, center: tuple[float, float] = (0, 0)
+    ) -> None:
         print(f"draw raster circle of radius {radius}")
+        self.__draw_circles(np.array([center], dtype=np.float64), np.array([radius]))
+
+    def render_circles(self, centers: npt.ArrayLike, radii: npt.ArrayLike) -> None:
+        c = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        r = np.asarray(radii, dtype=np.float64).ravel()
+        print(f"draw {len(r)} raster circles")
+        self.__draw_circles(c, r)
+
+    def __draw_circles(self, c: FloatArray, r: FloatArray) -> None:
+        if self.sprites is not None:
+            self.__blit_circles(c, r, self.sprites)
+            return
+
+        # pixel bounding box of every circle, (2 * half + 1) pixels on each side,
+        # clipped to the pixel buffer
+        height, width = self.pixels.shape
+        half = np.ceil(r + 0.5).astype(np.int_)
+        left = np.clip(np.rint(c[:, 0]).astype(np.int_) - half, 0, width)
+        right = np.clip(np.rint(c[:, 0]).astype(np.int_) + half + 1, 0, width)
+        top = np.clip(np.rint(c[:, 1]).astype(np.int_) - half, 0, height)
+        bottom = np.clip(np.rint(c[:, 1]).astype(np.int_) + half + 1, 0, height)
+        box_width = right - left
+        counts = box_width * (bottom - top)
+
+        # circles are rasterized in batches of at most max_pixels candidate pixels (a
+        # circle larger than that forms a batch of its own), so memory stays bounded
+        ends = np.cumsum(counts)
+        start = 0
+        while start < len(r):
+            limit = ends[start] - counts[start] + self.max_pixels
+            end = max(int(np.searchsorted(ends, limit, side="right")), start + 1)
+            batch = slice(start, end)
+            self.__rasterize_circles(
+                c[batch],
+                r[batch],
+                left[batch],
+                top[batch],
+                box_width[batch],
+                counts[batch],
+            )
+            start = end
+
+    # rasterizes a batch of circles at once: every circle contributes the pixels of its
+    # clipped bounding box and keeps those whose distance from the center is within half
+    # a pixel of the radius
+    def __rasterize_circles(
+        self,
+        c: FloatArray,
+        r: FloatArray,
+        left: npt.NDArray[np.int_],
+        top: npt.NDArray[np.int_],
+        box_width: npt.NDArray[np.int_],
+        counts: npt.NDArray[np.int_],
+    ) -> None:
+        # index of the circle every candidate pixel belongs to and its offset in the box
+        owner = np.repeat(np.arange(len(r)), counts)
+        index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        x = left[owner] + index % box_width[owner]
+        y = top[owner] + index // box_width[owner]
+
+        distance = np.hypot(x - c[owner, 0], y - c[owner, 1])
+        visible = np.abs(distance - r[owner]) <= 0.5
+        self.pixels[y[visible], x[visible]] = 1
+
+    # sprite path: circles are snapped to whole pixel centers and quantized radii
+    def __blit_circles(
+        self, c: FloatArray, r: FloatArray, sprites: CircleSpriteCache
+    ) -> None:
+        height, width = self.pixels.shape
+        for (cx, cy), radius in zip(np.rint(c).astype(np.int_).tolist(), r.tolist()):
+            sprite = sprites.get(radius)
+            half = len(sprite) // 2
+            left, top = cx - half, cy - half
+            x0, y0 = max(left, 0), max(top, 0)
+            x1, y1 = min(left + len(sprite), width), min(top + len(sprite), height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            # clip the sprite to the part of it that lands inside the pixel buffer
+            rows = slice(y0 - top, y1 - top)
+            cols = slice(x0 - left, x1 - left)
+            clipped = sprite[rows, cols]
+            target = self.pixels[y0:y1, x0:x1]
+            np.maximum(target, clipped, out=target)
+
+    def erase(self, box: Box | None) -> None:
+        if box is None:
+            self.pixels[:] = 0
+            return
+        left, top, right, bottom = box
+        rows = slice(max(top, 0), max(bottom, 0))
+        cols = slice(max(left, 0), max(right, 0))
+        self.pixels[rows, cols] = 0
+
+    def circle_box(self, center: tuple[float, float], radius: float) -> Box | None:
+        if self.sprites is not None:
+            radius = self.sprites.key(radius) * self.sprites.step
+        half = int(np.ceil(radius + 0.5))
+        x, y = int(np.rint(center[0])), int(np.rint(center[1]))
+        return (x - half, y - half, x + half + 1, y + half + 1)
 
 
 # Abstraction defines abstraction's interface and refers to Implementor
 class Shape(ABC):
     renderer: Renderer
+    scene: "Scene | None" = None
 
     def __init__(self, renderer: Renderer) -> None:
         super().__init__()
@@ -33,6 +252,15 @@ class Shape(ABC):
     def draw(self) -> None:
         pass
 
+    # box the shape covers when drawn, None if unknown
+    def bounds(self) -> Box | None:
+        return None
+
+    # tells the scene holding the shape that it has to be drawn again
+    def mark_dirty(self) -> None:
+        if self.scene is not None:
+            self.scene.dirty[id(self)] = self
+
     def resize(self, factor: float) -> None:
         pass
 
@@ -40,17 +268,107 @@ class Shape(ABC):
 # RefinedAbastraction extends abstraction's interface
 class Circle(Shape):
     radius: float = 0
+    center: tuple[float, float] = (0, 0)
 
-    def __init__(self, renderer: Renderer, radius: float) -> None:
+    def __init__(
+        self, renderer: Renderer, radius: float, center: tuple[float, float] = (0, 0)
+    ) -> None:
         super().__init__(renderer)
         self.radius = radius
+        self.center = center
 
     # use the reference as a bridge to connect to a Renderer instance
     def draw(self) -> None:
-        self.renderer.render_circle(self.radius)
+        self.renderer.render_circle(self.radius, self.center)
+
+    def bounds(self) -> Box | None:
+        return self.renderer.circle_box(self.center, self.radius)
 
     def resize(self, factor: float) -> None:
         self.radius *= factor
+        self.mark_dirty()
+
+
+# batch drawing: circles that share a renderer are drawn with a single render_circles()
+# call
+def draw_shapes(shapes: Iterable[Shape]) -> None:
+    circles: dict[int, tuple[Renderer, list[Circle]]] = {}
+    for shape in shapes:
+        if isinstance(shape, Circle):
+            circles.setdefault(id(shape.renderer), (shape.renderer, []))[1].append(
+                shape
+            )
+        else:
+            shape.draw()
+
+    for renderer, batch in circles.values():
+        renderer.render_circles([c.center for c in batch], [c.radius for c in batch])
+
+
+def overlaps(a: Box | None, b: Box | None) -> bool:
+    if a is None or b is None:
+        return True
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+# retained mode: the scene keeps a display list of shapes and, on flush, draws only the
+# shapes changed since the previous flush, merged into one batch per renderer; on
+# retained renderers the boxes changed shapes covered are erased first and the unchanged
+# shapes overlapping those boxes are drawn again as well
+class Scene:
+    shapes: dict[int, Shape]
+    dirty: dict[int, Shape]
+    drawn: dict[int, Box | None]
+    damage: dict[int, tuple[Renderer, list[Box | None]]]
+
+    def __init__(self) -> None:
+        self.shapes = {}
+        self.dirty = {}
+        self.drawn = {}
+        self.damage = {}
+
+    def add(self, shape: Shape) -> None:
+        self.shapes[id(shape)] = shape
+        shape.scene = self
+        shape.mark_dirty()
+
+    def remove(self, shape: Shape) -> None:
+        self.shapes.pop(id(shape), None)
+        self.dirty.pop(id(shape), None)
+        self.__damage(shape)
+        self.drawn.pop(id(shape), None)
+        shape.scene = None
+
+    # the box a shape covered when it was last drawn has to be erased
+    def __damage(self, shape: Shape) -> None:
+        if shape.renderer.retained and id(shape) in self.drawn:
+            renderer = shape.renderer
+            boxes = self.damage.setdefault(id(renderer), (renderer, []))[1]
+            boxes.append(self.drawn[id(shape)])
+
+    def flush(self) -> int:
+        shapes = dict(self.dirty)
+        self.dirty.clear()
+        for shape in shapes.values():
+            self.__damage(shape)
+
+        for renderer, boxes in self.damage.values():
+            for box in boxes:
+                renderer.erase(box)
+            for key, shape in self.shapes.items():
+                if (
+                    shape.renderer is renderer
+                    and key not in shapes
+                    and key in self.drawn
+                    and any(overlaps(self.drawn[key], box) for box in boxes)
+                ):
+                    shapes[key] = shape
+        self.damage.clear()
+
+        draw_shapes(shapes.values())
+        for key, shape in shapes.items():
+            self.drawn[key] = shape.bounds()
+        return len(shapes)
 
 
 if __name__ == "__main__":
@@ -65,3 +383,27 @@ if __name__ == "__main__":
     vector_circle.draw()
 
     raster_circle.draw()
+
+    circles = [Circle(raster_renderer, r, (32, 32)) for r in range(4, 32, 4)]
+    draw_shapes([*circles, vector_circle])
+    for row in raster_renderer.pixels[::2]:
+        print("".join(".#"[p] for p in row))
+
+    scene = Scene()
+    for c in [*circles, vector_circle]:
+        scene.add(c)
+    scene.flush()
+    circles[0].resize(0.5)
+    vector_circle.resize(2)
+    scene.flush()
+    scene.flush()
+
+    sprites = CircleSpriteCache(step=0.5)
+    sprite_renderer = RasterRenderer(sprites=sprites)
+    draw_shapes([Circle(sprite_renderer, 4 + i % 3, (i, i)) for i in range(64)])
+    print(
+        f"sprite cache hit rate {sprites.hit_rate:.2f}, {len(sprites.sprites)} sprites"
+    )
+    sprites.set_step(1.0)
+    draw_shapes([Circle(sprite_renderer, 4 + i % 3, (i, i)) for i in range(64)])
+    print(f"step 1.0: {len(sprites.sprites)} sprites, {sprites.evictions} evictions")
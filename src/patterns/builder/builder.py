@@ -1,3 +1,9 @@
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from typing import Iterator, TextIO
+
+
 # clumsy way of building HTML elements
 def build_html_clumsy() -> None:
     text = "hello"
@@ -28,50 +34,432 @@ class HtmlElement:
         self.text = text
         self.elements = []
 
-    def __str(self, indent: int) -> str:
-        lines = []
+    # serialize without recursion: an explicit stack of open elements and iterators over
+    # their remaining children replaces the call stack, so deep trees don't hit the
+    # recursion limit, chunks are yielded instead of joined per level and extra memory
+    # grows with the depth of the tree only
+    def iter_chunks(self) -> Iterator[str]:
+        # indentation strings are built once per depth
+        indents: list[str] = []
+        stack: list[tuple[HtmlElement, int, Iterator[HtmlElement]]] = []
+        element, depth = self, 0
+        separator = ""
+        while True:
+            while len(indents) <= depth + 1:
+                indents.append(" " * (len(indents) * self.indent_size))
 
-        # opening tag
-        tag_indent = " " * (indent * self.indent_size)
-        lines.append(f"{tag_indent}<{self.name}>")
+            # opening tag
+            yield f"{separator}{indents[depth]}<{element.name}>"
+            separator = "\n"
 
-        # content
-        if self.text:
-            text_indent = " " * ((indent + 1) * self.indent_size)
-            lines.append(f"{text_indent}<{self.text}>")
+            # content
+            if element.text:
+                yield f"\n{indents[depth + 1]}<{element.text}>"
 
-        # children
-        for e in self.elements:
-            lines.append(e.__str(indent + 1))
+            # next child to open; elements without children left are closed
+            stack.append((element, depth, iter(element.elements)))
+            while stack:
+                parent, parent_depth, children = stack[-1]
+                child = next(children, None)
+                if child is not None:
+                    element, depth = child, parent_depth + 1
+                    break
+                stack.pop()
+                yield f"\n{indents[parent_depth]}</{parent.name}>"
+            else:
+                return
 
-        # closing tag
-        lines.append(f"{tag_indent}</{self.name}>")
-
-        return "\n".join(lines)
+    def write(self, stream: TextIO) -> None:
+        for chunk in self.iter_chunks():
+            stream.write(chunk)
 
     def __str__(self) -> str:
-        return self.__str(0)
+        return "".join(self.iter_chunks())
 
     @staticmethod
     def create_builder(name: str) -> "HtmlBuilder":
         return HtmlBuilder(name)
 
 
+# lines of a rendered subtree; nested lists hold lines of nested subtrees
+_Lines = list["str | _Lines"]
+
+
+def _iter_lines(lines: _Lines) -> Iterator[str]:
+    stack = [iter(lines)]
+    while stack:
+        line = next(stack[-1], None)
+        if line is None:
+            stack.pop()
+        elif isinstance(line, str):
+            yield line
+        else:
+            stack.append(iter(line))
+
+
+# arena representation: all nodes of a document live in flat tables instead of one
+# object per element; tag names are interned in a name table and children are linked by
+# index
+class HtmlDocument:
+    names: list[str]
+    name_ids: dict[str, int]
+    node_names: "array[int]"
+    texts: list[str]
+    parents: "array[int]"
+    first_child: "array[int]"
+    last_child: "array[int]"
+    next_sibling: "array[int]"
+    # memoized serialization of subtrees (opt-in): node -> (depth, rendered subtree),
+    # least recently used first; only elements with children rendering to at least
+    # memo_min characters are memoized, and at most memo_budget characters in total
+    rendered: OrderedDict[int, tuple[int, str]]
+    memo_budget: int
+    memo_min: int = 1 << 12
+    memo_size: int
+
+    def __init__(self, memo_budget: int = 0) -> None:
+        self.names = []
+        self.name_ids = {}
+        self.node_names = array("i")
+        self.texts = []
+        # -1 marks a missing parent, child or sibling
+        self.parents = array("i")
+        self.first_child = array("i")
+        self.last_child = array("i")
+        self.next_sibling = array("i")
+        self.rendered = OrderedDict()
+        self.memo_budget = memo_budget
+        self.memo_size = 0
+
+    def __len__(self) -> int:
+        return len(self.node_names)
+
+    def intern(self, name: str) -> int:
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def add_node(self, name: str, text: str = "", parent: int = -1) -> int:
+        index = len(self)
+        self.node_names.append(self.intern(name))
+        self.texts.append(text)
+        self.parents.append(parent)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+
+        if parent >= 0:
+            if self.first_child[parent] < 0:
+                self.first_child[parent] = index
+            else:
+                self.next_sibling[self.last_child[parent]] = index
+            self.last_child[parent] = index
+            self.invalidate(parent)
+        return index
+
+    # bulk insertion of sibling nodes with the same tag under one parent: the tag is
+    # interned once and the tables are extended in one go
+    def add_nodes(self, name: str, texts: Iterable[str], parent: int) -> range:
+        start = len(self)
+        self.texts.extend(texts)
+        stop = len(self.texts)
+        if stop == start:
+            return range(start, stop)
+
+        count = stop - start
+        self.node_names.extend(array("i", [self.intern(name)]) * count)
+        self.parents.extend(array("i", [parent]) * count)
+        self.first_child.extend(array("i", [-1]) * count)
+        self.last_child.extend(array("i", [-1]) * count)
+        self.next_sibling.extend(range(start + 1, stop))
+        self.next_sibling.append(-1)
+
+        if self.first_child[parent] < 0:
+            self.first_child[parent] = start
+        else:
+            self.next_sibling[self.last_child[parent]] = start
+        self.last_child[parent] = stop - 1
+        self.invalidate(parent)
+        return range(start, stop)
+
+    def set_text(self, index: int, text: str) -> None:
+        self.texts[index] = text
+        self.invalidate(index)
+
+    # drop memoized output of the node and its ancestors
+    def invalidate(self, index: int) -> None:
+        if not self.rendered:
+            return
+        while index >= 0:
+            entry = self.rendered.pop(index, None)
+            if entry is not None:
+                self.memo_size -= len(entry[1])
+            index = self.parents[index]
+
+    def clear_memo(self) -> None:
+        self.rendered.clear()
+        self.memo_size = 0
+
+    def __memoized(self, index: int, depth: int) -> str | None:
+        entry = self.rendered.get(index)
+        if entry is None or entry[0] != depth:
+            return None
+        self.rendered.move_to_end(index)
+        return entry[1]
+
+    def __memoize(self, index: int, depth: int, rendered: str) -> None:
+        entry = self.rendered.pop(index, None)
+        if entry is not None:
+            self.memo_size -= len(entry[1])
+        self.rendered[index] = (depth, rendered)
+        self.memo_size += len(rendered)
+        while self.memo_size > self.memo_budget:
+            _, (_, evicted) = self.rendered.popitem(last=False)
+            self.memo_size -= len(evicted)
+
+    def children(self, index: int) -> Iterator[int]:
+        child = self.first_child[index]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def node(self, index: int) -> "HtmlNode":
+        return HtmlNode(self, index)
+
+    # same output as HtmlElement.iter_chunks(), walking the tables by index; depth
+    # indents the whole subtree; only the open nodes are kept, the next child is reached
+    # through next_sibling when a subtree closes
+    def iter_chunks(self, index: int = 0, depth: int = 0) -> Iterator[str]:
+        indent_size = HtmlElement.indent_size
+        indents: list[str] = []
+        open_nodes: list[int] = []
+        node = index
+        while True:
+            while len(indents) <= depth + 1:
+                indents.append(" " * (len(indents) * indent_size))
+
+            name = self.names[self.node_names[node]]
+            separator = "\n" if open_nodes else ""
+            yield f"{separator}{indents[depth]}<{name}>"
+
+            text = self.texts[node]
+            if text:
+                yield f"\n{indents[depth + 1]}<{text}>"
+
+            open_nodes.append(node)
+            child = self.first_child[node]
+            if child >= 0:
+                node, depth = child, depth + 1
+                continue
+
+            # close nodes until one of them has a next sibling
+            while open_nodes:
+                node = open_nodes.pop()
+                yield f"\n{indents[depth]}</{self.names[self.node_names[node]]}>"
+                if not open_nodes:
+                    return
+                sibling = self.next_sibling[node]
+                if sibling >= 0:
+                    node = sibling
+                    break
+                depth -= 1
+
+    # same output as iter_chunks(); with a memo budget memoized subtrees are reused and
+    # large ones memoized, so rendering again after an edit mostly serializes the nodes
+    # on the edited path
+    def render(self, index: int = 0, depth: int = 0) -> str:
+        if not self.memo_budget:
+            return "".join(self.iter_chunks(index, depth))
+        cached = self.__memoized(index, depth)
+        if cached is not None:
+            return cached
+
+        indent_size = HtmlElement.indent_size
+        # open nodes, their lines and the total length of those, innermost last; lines
+        # of subtrees that aren't memoized are nested as lists, so they are joined only
+        # once at the end instead of once per ancestor; the next child is reached
+        # through next_sibling when a subtree closes
+        open_nodes: list[int] = []
+        open_lines: list[_Lines] = []
+        open_lengths: list[int] = []
+        node = index
+        while True:
+            cached = self.__memoized(node, depth) if open_nodes else None
+            if cached is not None:
+                open_lines[-1].append(cached)
+                open_lengths[-1] += len(cached) + 1
+            else:
+                name = self.names[self.node_names[node]]
+                lines: _Lines = [f"{' ' * (depth * indent_size)}<{name}>"]
+                text = self.texts[node]
+                if text:
+                    lines.append(f"{' ' * ((depth + 1) * indent_size)}<{text}>")
+                open_nodes.append(node)
+                open_lines.append(lines)
+                open_lengths.append(sum(len(line) + 1 for line in lines))
+
+                child = self.first_child[node]
+                if child >= 0:
+                    node, depth = child, depth + 1
+                    continue
+
+            # the node is complete; close open nodes until one of them has a next
+            # sibling
+            while True:
+                if node == open_nodes[-1]:
+                    open_nodes.pop()
+                    closed = open_lines.pop()
+                    name = self.names[self.node_names[node]]
+                    closed.append(f"{' ' * (depth * indent_size)}</{name}>")
+                    length = open_lengths.pop() + len(closed[-1])
+
+                    subtree: str | _Lines = closed
+                    if (
+                        self.memo_min <= length <= self.memo_budget
+                        and self.first_child[node] >= 0
+                    ):
+                        subtree = "\n".join(_iter_lines(closed))
+                        self.__memoize(node, depth, subtree)
+                    if not open_nodes:
+                        return "\n".join(_iter_lines([subtree]))
+                    open_lines[-1].append(subtree)
+                    open_lengths[-1] += length + 1
+
+                sibling = self.next_sibling[node]
+                if sibling >= 0:
+                    node = sibling
+                    break
+                node, depth = open_nodes[-1], depth - 1
+
+
+# lightweight view of a single HtmlDocument node with the HtmlElement interface
+class HtmlNode:
+    __slots__ = ("document", "index")
+    document: HtmlDocument
+    index: int
+
+    def __init__(self, document: HtmlDocument, index: int) -> None:
+        self.document = document
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.document.names[self.document.node_names[self.index]]
+
+    @property
+    def text(self) -> str:
+        return self.document.texts[self.index]
+
+    @text.setter
+    def text(self, text: str) -> None:
+        self.document.set_text(self.index, text)
+
+    @property
+    def elements(self) -> list["HtmlNode"]:
+        return [HtmlNode(self.document, c) for c in self.document.children(self.index)]
+
+    def add_child(self, name: str, text: str = "") -> "HtmlNode":
+        return HtmlNode(self.document, self.document.add_node(name, text, self.index))
+
+    def add_children(self, name: str, texts: Iterable[str]) -> range:
+        return self.document.add_nodes(name, texts, self.index)
+
+    def iter_chunks(self) -> Iterator[str]:
+        return self.document.iter_chunks(self.index)
+
+    def write(self, stream: TextIO) -> None:
+        for chunk in self.iter_chunks():
+            stream.write(chunk)
+
+    def __str__(self) -> str:
+        return self.document.render(self.index)
+
+
 class HtmlBuilder:
-    __root: HtmlElement
+    __root: HtmlNode
 
-    # NB: builder constructs the built object instance
-    def __init__(self, name: str, text: str = "") -> None:
-        self.__root = HtmlElement(name=name, text=text)
+    # NB: builder constructs the built object instance, a node of its own document
+    def __init__(self, name: str, text: str = "", memo_budget: int = 0) -> None:
+        document = HtmlDocument(memo_budget)
+        self.__root = document.node(document.add_node(name, text))
+
+    @property
+    def root(self) -> HtmlNode:
+        return self.__root
 
     def add_child(self, child_name: str, child_text: str) -> "HtmlBuilder":
-        self.__root.elements.append(HtmlElement(name=child_name, text=child_text))
+        self.__root.add_child(child_name, child_text)
+        return self
+
+    def add_children(
+        self, child_name: str, child_texts: Iterable[str]
+    ) -> "HtmlBuilder":
+        self.__root.add_children(child_name, child_texts)
         return self
 
+    def write(self, stream: TextIO) -> None:
+        self.__root.write(stream)
+
     def __str__(self) -> str:
         return str(self.__root)
 
 
+# template: an element shape is serialized once into static fragments and slots; slots
+# are marked in texts with HtmlTemplate.slot(), e.g.
+# HtmlBuilder("tr").add_child("td", HtmlTemplate.slot("name")), and rendering a row only
+# joins the fragments with the formatted slot values; markers are made of private use
+# characters, so static text, braces included, is kept as is and needs no escaping
+class HtmlTemplate:
+    slot_start = "\ue000"
+    slot_spec = "\ue001"
+    slot_end = "\ue002"
+    fragments: list[str]
+    slots: list[str]
+    specs: list[str]
+
+    # marker of a slot whose value is formatted with format(value, format_spec)
+    @classmethod
+    def slot(cls, name: str, format_spec: str = "") -> str:
+        start, spec, end = cls.slot_start, cls.slot_spec, cls.slot_end
+        if any(m in name + format_spec for m in (start, spec, end)):
+            raise ValueError("slot names and format specs can't contain slot markers")
+        return f"{start}{name}{spec}{format_spec}{end}"
+
+    def __init__(self, element: HtmlElement | HtmlNode, depth: int = 0) -> None:
+        source = "".join(element.iter_chunks())
+        if depth:
+            indent = " " * (depth * HtmlElement.indent_size)
+            source = indent + source.replace("\n", "\n" + indent)
+
+        # fragments[i] precedes slots[i]; the last fragment follows the last slot
+        fragment, *marked = source.split(self.slot_start)
+        self.fragments = [fragment]
+        self.slots = []
+        self.specs = []
+        for part in marked:
+            slot, end, fragment = part.partition(self.slot_end)
+            name, spec, format_spec = slot.partition(self.slot_spec)
+            if not end or not spec or self.slot_end in fragment:
+                raise ValueError("malformed slot marker in template")
+            self.slots.append(name)
+            self.specs.append(format_spec)
+            self.fragments.append(fragment)
+        if self.slot_end in self.fragments[0]:
+            raise ValueError("malformed slot marker in template")
+
+    def render(self, values: Mapping[str, object]) -> str:
+        parts = [self.fragments[0]]
+        for slot, spec, fragment in zip(self.slots, self.specs, self.fragments[1:]):
+            parts.append(format(values[slot], spec))
+            parts.append(fragment)
+        return "".join(parts)
+
+    def render_rows(self, rows: Iterable[Mapping[str, object]]) -> str:
+        return "\n".join(self.render(row) for row in rows)
+
+
 def build_html_builder() -> None:
     builder = HtmlBuilder("ul")
     builder.add_child("li", "hello")
@@ -86,6 +474,20 @@ def build_html_builder() -> None:
     builder.add_child("li", "hello").add_child("li", "world")
     print(builder)
 
+    builder = HtmlBuilder("ul")
+    builder.add_children("li", ["hello", "world"])
+    print(builder)
+
+
+def build_html_template() -> None:
+    row = HtmlBuilder("tr")
+    row.add_child("td", HtmlTemplate.slot("name"))
+    row.add_child("td", HtmlTemplate.slot("city", ">8"))
+    template = HtmlTemplate(row.root, depth=1)
+    rows = [{"name": "John", "city": "London"}, {"name": "Jane", "city": "Paris"}]
+    print("\n".join(["<table>", template.render_rows(rows), "</table>"]))
+
 
 # build_html_clumsy()
 build_html_builder()
+build_html_template()
@@ -1,12 +1,25 @@
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from typing import Any
+
+
 class Person:
+    __slots__ = ("address", "postal_code", "city", "company", "position", "income")
     # private
-    address: str = ""
-    postal_code: str = ""
-    city: str = ""
+    address: str
+    postal_code: str
+    city: str
     # employment
-    company: str = ""
-    position: str = ""
-    income: str = ""
+    company: str
+    position: str
+    income: str
+
+    def __init__(self) -> None:
+        self.address = ""
+        self.postal_code = ""
+        self.city = ""
+        self.company = ""
+        self.position = ""
+        self.income = ""
 
     def __str__(self) -> str:
         return (
@@ -19,8 +32,9 @@ class PersonBuilder:
     person: Person
 
     # Person is mutable, so on every __init__() call new Person instance is constructed
-    def __init__(self, person: Person = Person()) -> None:
-        self.person = person
+    # NB: a Person() default argument would be a single instance shared by all builders
+    def __init__(self, person: Person | None = None) -> None:
+        self.person = person if person is not None else Person()
 
     # properties construct builders, but they reuse the preconstructed Person instance
     # NB: this breaks the open close principle
@@ -70,6 +84,53 @@ class PersonEmploymentBuilder(PersonBuilder):
         return self
 
 
+# batch builder: builds many persons per call from columnar input, e.g. csv.reader()
+# rows or a dict of lists; the field assignments are compiled once per field list into a
+# plain function instead of going through a builder method per field and person
+class PersonBatchBuilder:
+    fields: tuple[str, ...]
+    plans: dict[tuple[str, ...], Callable[[Iterable[Sequence[str]]], list[Person]]] = {}
+
+    def __init__(self, fields: Sequence[str]) -> None:
+        unknown = [f for f in fields if f not in Person.__slots__]
+        if unknown:
+            raise ValueError(f"unknown Person fields: {', '.join(unknown)}")
+        self.fields = tuple(fields)
+        if self.fields not in self.plans:
+            self.plans[self.fields] = self.__compile(self.fields)
+
+    @staticmethod
+    def __compile(
+        fields: tuple[str, ...]
+    ) -> Callable[[Iterable[Sequence[str]]], list[Person]]:
+        # fields missing from the input keep their default value
+        assignments = [f"person.{f} = row[{i}]" for i, f in enumerate(fields)]
+        assignments += [f'person.{f} = ""' for f in Person.__slots__ if f not in fields]
+        body = "\n        ".join(assignments)
+        source = f"""
+def build(rows):
+    persons = []
+    for row in rows:
+        person = new(Person)
+        {body}
+        persons.append(person)
+    return persons
+"""
+        namespace: dict[str, Any] = {"Person": Person, "new": Person.__new__}
+        exec(source, namespace)
+        build: Callable[[Iterable[Sequence[str]]], list[Person]] = namespace["build"]
+        return build
+
+    def build_rows(self, rows: Iterable[Sequence[str]]) -> list[Person]:
+        return self.plans[self.fields](rows)
+
+    @staticmethod
+    def build_columns(columns: Mapping[str, Sequence[str]]) -> list[Person]:
+        if len({len(column) for column in columns.values()}) > 1:
+            raise ValueError("columns must have the same length")
+        return PersonBatchBuilder(list(columns)).build_rows(zip(*columns.values()))
+
+
 person_builder_1 = PersonBuilder()
 person_builder_1.lives.at_address("Studentska 27").with_postal_code("11070").in_city(
     "Belgrade"
@@ -80,4 +141,14 @@ person_builder_2 = PersonBuilder()
 person_builder_2.lives.at_address("Cvetni trg 3").with_postal_code("21000").in_city(
     "Novi Sad"
 ).works.in_company("Startas").at_position("sales manager").with_income("34k")
-print(person_builder_1.person)
+print(person_builder_2.person)
+
+persons = PersonBatchBuilder.build_columns(
+    {
+        "address": ["Studentska 27", "Cvetni trg 3"],
+        "city": ["Belgrade", "Novi Sad"],
+        "company": ["Meteor", "Startas"],
+    }
+)
+for p in persons:
+    print(p)
@@ -1,5 +1,8 @@
+import asyncio
 from abc import ABC
-from enum import Enum, auto
+from collections.abc import Iterable
+from math import ceil, log
+from time import perf_counter
 
 
 # object hierarchy
@@ -27,20 +30,64 @@ class Coffee(HotDrink):
 # abstract factory; used to mandate interface
 # essential in strongly typed languages, optional in Python
 class HotDrinkFactory(ABC):
+    # type of the drinks the factory prepares
+    drink_type: type[HotDrink] = HotDrink
+    # optional free-list pool of consumed drinks; pool_size 0 disables pooling
+    pool_size: int
+    pool: list[HotDrink]
+    pooled: set[int]
+    allocations_avoided: int
+    pool_misses: int
+
+    def __init__(self, pool_size: int = 0) -> None:
+        self.pool_size = pool_size
+        self.pool = []
+        self.pooled = set()
+        self.allocations_avoided = 0
+        self.pool_misses = 0
+
     def prepare(self, quantity: int) -> HotDrink:
         pass
 
+    # recycle protocol: a drink that is no longer used is released to the factory that
+    # prepared it, which hands it out again instead of allocating a new one; a drink of
+    # another type or one that is already in the pool is rejected
+    def release(self, drink: HotDrink) -> None:
+        if type(drink) is not self.drink_type:
+            raise TypeError(
+                f"{type(self).__name__} can't take back {type(drink).__name__}"
+            )
+        if id(drink) in self.pooled:
+            raise ValueError("drink was already released")
+        if len(self.pool) < self.pool_size:
+            self.pool.append(drink)
+            self.pooled.add(id(drink))
+
+    def reuse(self) -> HotDrink | None:
+        if self.pool:
+            self.allocations_avoided += 1
+            drink = self.pool.pop()
+            self.pooled.discard(id(drink))
+            return drink
+        if self.pool_size:
+            self.pool_misses += 1
+        return None
+
+
+class TeaFactory(HotDrinkFactory):
+    drink_type = Tea
 
-class TeaFactory(ABC):
     def prepare(self, quantity: int) -> HotDrink:
-        tea = Tea()
+        tea = self.reuse() or Tea()
         tea.quantity = quantity
         return tea
 
 
-class CoffeeFactory(ABC):
+class CoffeeFactory(HotDrinkFactory):
+    drink_type = Coffee
+
     def prepare(self, quantity: int) -> HotDrink:
-        coffee = Coffee()
+        coffee = self.reuse() or Coffee()
         coffee.quantity = quantity
         return coffee
 
@@ -55,33 +102,179 @@ def make_drink(type: str) -> HotDrink | None:
 
 
 class HotDrinkMachine:
-    factories: list[tuple[str, HotDrinkFactory]] = []
-    _initialized: bool = False
-
-    class AvailableDrink(Enum):
-        TEA = auto()
-        COFFEE = auto()
+    # registry of factories by drink name, shared by all machines
+    factories: dict[str, HotDrinkFactory] = {}
+    orders: int
+    orders_per_second: float
 
     def __init__(self) -> None:
-        if not self._initialized:
-            for d in self.AvailableDrink:
-                name = d.name[0] + d.name[1:].lower()
-                factory_name = name + "Factory"
-                factory_instance = eval(factory_name)()
-                self.factories.append((name, factory_instance))
-            self._initialized = True
-        pass
+        self.orders = 0
+        self.orders_per_second = 0.0
+
+    @classmethod
+    def register(cls, name: str, factory: HotDrinkFactory) -> None:
+        cls.factories[name] = factory
+
+    def prepare(self, name: str, quantity: int) -> HotDrink:
+        factory = self.factories.get(name)
+        if factory is None:
+            raise ValueError(f"unknown drink: {name}")
+        return factory.prepare(quantity)
+
+    # returns a consumed drink to the pool of the factory it was ordered from
+    def release(self, name: str, drink: HotDrink) -> None:
+        factory = self.factories.get(name)
+        if factory is None:
+            raise ValueError(f"unknown drink: {name}")
+        factory.release(drink)
 
     def make_drink(self) -> HotDrink:
+        names = list(self.factories)
         print("Available drinks: ")
-        for i in range(len(self.factories)):
-            print(str(i) + f": {self.factories[i][0]}")
+        for i, name in enumerate(names):
+            print(f"{i}: {name.capitalize()}")
 
-        s = input(f"Pick a drink (0-{len(self.factories)-1}): ")
+        s = input(f"Pick a drink (0-{len(names)-1}): ")
         idx = int(s)
         s = input("Specify quantity: ")
         quantity = int(s)
-        return self.factories[idx][1].prepare(quantity)
+        return self.prepare(names[idx], quantity)
+
+    # non-interactive batch ordering; orders are (drink name, quantity) pairs
+    def make_drinks(self, orders: Iterable[tuple[str, int]]) -> list[HotDrink]:
+        start = perf_counter()
+        factories = self.factories
+        try:
+            drinks = [factories[name].prepare(quantity) for name, quantity in orders]
+        except KeyError as e:
+            raise ValueError(f"unknown drink: {e.args[0]}") from None
+        elapsed = perf_counter() - start
+
+        self.orders += len(drinks)
+        self.orders_per_second = len(drinks) / elapsed if elapsed > 0 else 0.0
+        return drinks
+
+
+HotDrinkMachine.register("tea", TeaFactory(pool_size=64))
+HotDrinkMachine.register("coffee", CoffeeFactory(pool_size=64))
+
+
+# latency histogram with geometric buckets: bucket k counts latencies up to resolution *
+# growth ** k seconds, so memory stays constant however many orders are served
+class LatencyHistogram:
+    resolution: float
+    growth: float
+    buckets: list[int]
+    count: int
+
+    def __init__(self, resolution: float = 1e-6, growth: float = 1.1) -> None:
+        self.resolution = resolution
+        self.growth = growth
+        self.buckets = []
+        self.count = 0
+
+    def record(self, latency: float) -> None:
+        ratio = max(latency / self.resolution, 1.0)
+        bucket = ceil(log(ratio, self.growth))
+        if bucket >= len(self.buckets):
+            self.buckets.extend([0] * (bucket + 1 - len(self.buckets)))
+        self.buckets[bucket] += 1
+        self.count += 1
+
+    # upper bound of the bucket holding the given percentile, in seconds
+    def percentile(self, p: float) -> float:
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return self.resolution * self.growth**bucket
+        return 0.0
+
+
+# asyncio front end: orders wait in a bounded queue served by worker coroutines; when
+# the queue is full, order() waits for free space (backpressure)
+class HotDrinkService:
+    machine: HotDrinkMachine
+    workers: int
+    queue: asyncio.Queue[tuple[str, int, "asyncio.Future[HotDrink]", float]]
+    latencies: LatencyHistogram
+    completed: int
+    failed: int
+
+    def __init__(
+        self, machine: HotDrinkMachine, workers: int = 4, queue_size: int = 1024
+    ) -> None:
+        self.machine = machine
+        self.workers = workers
+        self.queue = asyncio.Queue(queue_size)
+        self.latencies = LatencyHistogram()
+        self.completed = 0
+        self.failed = 0
+        self.__tasks: list[asyncio.Task[None]] = []
+        self.__started = 0.0
+        self.__stopped: float | None = None
+
+    async def start(self) -> None:
+        self.__started = perf_counter()
+        self.__stopped = None
+        self.__tasks = [asyncio.create_task(self.__work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        await self.queue.join()
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
+        self.__stopped = perf_counter()
+
+    async def order(self, name: str, quantity: int) -> HotDrink:
+        future: asyncio.Future[HotDrink] = asyncio.get_running_loop().create_future()
+        await self.queue.put((name, quantity, future, perf_counter()))
+        return await future
+
+    @property
+    def throughput(self) -> float:
+        stopped = perf_counter() if self.__stopped is None else self.__stopped
+        elapsed = stopped - self.__started
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    async def __work(self) -> None:
+        while True:
+            name, quantity, future, ordered = await self.queue.get()
+            try:
+                # the client stopped waiting, e.g. its order() was cancelled
+                if future.done():
+                    continue
+                try:
+                    drink = self.machine.prepare(name, quantity)
+                except Exception as e:
+                    future.set_exception(e)
+                    self.failed += 1
+                    continue
+                future.set_result(drink)
+                self.latencies.record(perf_counter() - ordered)
+                self.completed += 1
+            finally:
+                self.queue.task_done()
+
+
+# local load generator: every client places its orders one after another
+async def generate_load(
+    service: HotDrinkService, clients: int, orders_per_client: int
+) -> list[HotDrink]:
+    names = list(service.machine.factories)
+
+    async def client(i: int) -> list[HotDrink]:
+        return [
+            await service.order(names[(i + j) % len(names)], 100)
+            for j in range(orders_per_client)
+        ]
+
+    await service.start()
+    results = await asyncio.gather(*(client(i) for i in range(clients)))
+    await service.stop()
+    return [drink for drinks in results for drink in drinks]
 
 
 if __name__ == "__main__":
@@ -93,3 +286,23 @@ if __name__ == "__main__":
     hdm = HotDrinkMachine()
     drink = hdm.make_drink()
     drink.consume()
+
+    drinks = hdm.make_drinks([("tea", 200), ("coffee", 50)] * 50000)
+    print(f"Made {len(drinks)} drinks at {hdm.orders_per_second:.0f} orders/s")
+
+    for _ in range(1000):
+        tea = hdm.prepare("tea", 200)
+        hdm.release("tea", tea)
+    tea_factory = hdm.factories["tea"]
+    print(
+        f"Tea pool: {tea_factory.allocations_avoided} allocations avoided, "
+        + f"{tea_factory.pool_misses} misses"
+    )
+
+    service = HotDrinkService(hdm, workers=4, queue_size=64)
+    drinks = asyncio.run(generate_load(service, clients=100, orders_per_client=500))
+    print(
+        f"Served {len(drinks)} orders at {service.throughput:.0f} orders/s, "
+        + f"p50 {service.latencies.percentile(50) * 1e6:.0f}us, "
+        + f"p99 {service.latencies.percentile(99) * 1e6:.0f}us"
+    )
@@ -1,5 +1,11 @@
 from math import sin, cos, pi
 from enum import Enum
+from typing import Iterator
+
+import numpy as np
+import numpy.typing as npt
+
+FloatArray = npt.NDArray[np.float64]
 
 
 class CoordinateSystem(Enum):
@@ -35,8 +41,8 @@ class Point:
     def __str__(self) -> str:
         return f"x: {self.x}, y: {self.y}"
 
-    # factory is a method that creates an object; it is an aleternative to constructors and
-    # initalizers with multiple, special case parameters
+    # factory is a method that creates an object; it is an aleternative to constructors
+    # and initalizers with multiple, special case parameters
     @staticmethod
     def new_cartesian(x: float, y: float) -> "Point":
         return Point(x, y)
@@ -49,7 +55,8 @@ class Point:
     # everything is public)
     class PointFactory:
         def new_cartesian(self, x: float, y: float) -> "Point":
-            # use no params constructor to semantically decouple class factory from object class
+            # use no params constructor to semantically decouple class factory from
+            # object class
             p: Point = Point()
             p.x = x
             p.y = y
@@ -67,7 +74,8 @@ class Point:
 class PointFactory:
     @staticmethod
     def new_cartesian(x: float, y: float) -> "Point":
-        # use no params constructor to semantically decouple class factory from object class
+        # use no params constructor to semantically decouple class factory from object
+        # class
         p: Point = Point()
         p.x = x
         p.y = y
@@ -78,6 +86,63 @@ class PointFactory:
         return Point(rho * cos(theta), rho * sin(theta))
 
 
+# precomputed sin/cos table for angles quantized to steps per full turn
+class TrigTable:
+    steps: int
+    cos: FloatArray
+    sin: FloatArray
+
+    def __init__(self, steps: int = 4096) -> None:
+        self.steps = steps
+        angles = np.arange(steps) * (2 * pi / steps)
+        self.cos = np.cos(angles)
+        self.sin = np.sin(angles)
+
+    def lookup(self, theta: npt.ArrayLike) -> tuple[FloatArray, FloatArray]:
+        index = np.rint(np.asarray(theta) * (self.steps / (2 * pi))).astype(np.int_)
+        index %= self.steps
+        return self.cos[index], self.sin[index]
+
+
+# columnar counterpart of Point: many points as parallel x and y arrays, with factory
+# methods that convert whole arrays at once; single Points can still be taken out of it
+class PointArray:
+    x: FloatArray
+    y: FloatArray
+
+    def __init__(self, x: npt.ArrayLike = (), y: npt.ArrayLike = ()) -> None:
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        if self.x.shape != self.y.shape:
+            raise ValueError("x and y must have the same shape")
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __getitem__(self, index: int) -> Point:
+        return Point(float(self.x[index]), float(self.y[index]))
+
+    def __iter__(self) -> Iterator[Point]:
+        for x, y in zip(self.x.tolist(), self.y.tolist()):
+            yield Point(x, y)
+
+    @staticmethod
+    def from_cartesian(x: npt.ArrayLike, y: npt.ArrayLike) -> "PointArray":
+        return PointArray(x, y)
+
+    # with a table, angles are rounded to the table's steps instead of computed exactly
+    @staticmethod
+    def from_polar(
+        rho: npt.ArrayLike, theta: npt.ArrayLike, table: TrigTable | None = None
+    ) -> "PointArray":
+        r = np.asarray(rho, dtype=np.float64)
+        if table is not None:
+            cos_theta, sin_theta = table.lookup(theta)
+        else:
+            cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+        return PointArray(r * cos_theta, r * sin_theta)
+
+
 if __name__ == "__main__":
     # use constructor
     p1 = Point(10, 15)
@@ -90,4 +155,9 @@ if __name__ == "__main__":
     p4 = Point.factory.new_cartesian(1, 1)
     print(p4)
 
+    points = PointArray.from_polar(
+        np.ones(8), np.linspace(0, 2 * pi, 8, endpoint=False)
+    )
+    print(points[2])
+
     print()
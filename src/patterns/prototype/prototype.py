@@ -1,4 +1,333 @@
 import copy
+import mmap
+import pickle
+import struct
+from collections.abc import Callable, Iterator, Mapping
+from inspect import getattr_static
+from types import FunctionType, UnionType
+from typing import Any, TypeVar, get_args, get_type_hints
+from weakref import WeakValueDictionary
+
+T = TypeVar("T")
+
+# attributes of these types are shared by clones instead of copied
+IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None))
+
+
+# fast prototype copy: for every class a copy function is generated from its
+# annotations on first use and cached; it copies the instance __dict__, sharing
+# immutable attributes, copying attributes of annotated classes by their own generated
+# function and deepcopying any other attribute, annotated or not; like deepcopy, a memo
+# of copied objects keeps shared objects shared and cycles finite; classes without
+# annotations, with slots or with their own copy or pickle hooks are deepcopied
+Copier = Callable[[Any, dict[int, Any]], Any]
+copiers: dict[type, Copier] = {}
+
+
+def fast_copy(obj: T, memo: dict[int, Any] | None = None) -> T:
+    if memo is None:
+        memo = {}
+    else:
+        copied = memo.get(id(obj))
+        if copied is not None:
+            result: T = copied
+            return result
+    copier = copiers.get(type(obj))
+    if copier is None:
+        copier = copiers[type(obj)] = compile_copier(type(obj))
+    result = copier(obj, memo)
+    return result
+
+
+def is_immutable(cls: type) -> bool:
+    return issubclass(cls, IMMUTABLE_TYPES) or issubclass(cls, Flyweight)
+
+
+# hooks that change how instances are copied or pickled, or instances without __dict__
+COPY_HOOKS = (
+    "__setattr__",
+    "__deepcopy__",
+    "__reduce__",
+    "__reduce_ex__",
+    "__getstate__",
+    "__setstate__",
+    "__slots__",
+)
+
+
+def has_copy_hooks(cls: type) -> bool:
+    return any(h in vars(c) for c in cls.__mro__[:-1] for h in COPY_HOOKS)
+
+
+def compile_copier(cls: type) -> Copier:
+    if is_immutable(cls):
+        return lambda obj, memo: obj
+    try:
+        hints = get_type_hints(cls)
+    except NameError:
+        hints = {}
+    if not hints or has_copy_hooks(cls):
+        return copy.deepcopy
+
+    lines = [
+        "def copy_object(obj, memo):",
+        "    result = new(cls)",
+        "    memo[id(obj)] = result",
+        "    state = obj.__dict__",
+    ]
+    # annotated attributes are assigned one by one, which keeps the compact instance
+    # layout of the class, unlike updating the new instance's __dict__
+    for name, hint in hints.items():
+        # a union annotation, e.g. Address | InternedAddress, is handled by its members
+        types = get_args(hint) if isinstance(hint, UnionType) else (hint,)
+        lines.append(f"    if {name!r} in state:")
+        lines.append(f"        value = state[{name!r}]")
+        if not all(isinstance(t, type) for t in types):
+            lines.append(f"        result.{name} = deepcopy(value, memo)")
+        elif all(is_immutable(t) for t in types):
+            lines.append(f"        result.{name} = (")
+            lines.append("            value")
+            lines.append("            if type(value) in immutable_types")
+            lines.append("            else fast_copy(value, memo)")
+            lines.append("        )")
+        elif all(is_immutable(t) or t.__module__ != "builtins" for t in types):
+            lines.append(f"        result.{name} = fast_copy(value, memo)")
+        else:
+            lines.append(f"        result.{name} = deepcopy(value, memo)")
+    lines += [
+        "    if not fields.issuperset(state):",
+        "        for name in state.keys() - fields:",
+        "            setattr(result, name, deepcopy(state[name], memo))",
+        "    return result",
+    ]
+
+    namespace: dict[str, Any] = {
+        "cls": cls,
+        "new": cls.__new__,
+        "fields": frozenset(hints),
+        "immutable_types": frozenset(IMMUTABLE_TYPES),
+        "fast_copy": fast_copy,
+        "deepcopy": copy.deepcopy,
+    }
+    exec("\n".join(lines), namespace)
+    copier: Copier = namespace["copy_object"]
+    return copier
+
+
+# copy-on-write: clones share one object through a proxy; the first write through the
+# proxy copies the shared object, so writers never affect other clones; proxy variants
+# made by with_fields() keep some fields of their own, e.g. a per-clone suite, in slots
+# that override the shared object; the proxy passes isinstance() checks for the class of
+# the object it stands for, runs that class's methods and properties on itself, so they
+# see the own fields, and its __dict__ is a snapshot of the shared state merged with
+# the own fields; special methods other than __str__ and __repr__ aren't forwarded
+class CopyOnWrite:
+    __slots__ = ("_shared", "_own")
+    _shared: Any
+    _own: Any
+    own_fields: tuple[str, ...] = ()
+    variants: dict[tuple[str, ...], type["CopyOnWrite"]] = {}
+
+    def __init__(self, shared: Any, **own: Any) -> None:
+        object.__setattr__(self, "_shared", shared)
+        object.__setattr__(self, "_own", None)
+        for name, value in own.items():
+            if name not in self.own_fields:
+                raise TypeError(f"{name} isn't a field of {type(self).__name__}")
+            object.__setattr__(self, name, value)
+
+    @staticmethod
+    def with_fields(*names: str) -> type["CopyOnWrite"]:
+        variant = CopyOnWrite.variants.get(names)
+        if variant is None:
+            namespace = {"__slots__": names, "own_fields": names}
+            variant = type(
+                f"CopyOnWrite[{', '.join(names)}]", (CopyOnWrite,), namespace
+            )
+            CopyOnWrite.variants[names] = variant
+            copiers[variant] = copy_proxy
+        return variant
+
+    def __target(self) -> Any:
+        return self._shared if self._own is None else self._own
+
+    # only called for attributes that aren't own fields of the proxy
+    def __getattr__(self, name: str) -> Any:
+        target = self.__target()
+        attribute = getattr_static(type(target), name, None)
+        if isinstance(attribute, (FunctionType, property)):
+            return attribute.__get__(self, type(target))
+        return getattr(target, name)
+
+    @property
+    def __dict__(self) -> dict[str, Any]:  # type: ignore[override]
+        target = self.__target()
+        state = dict(getattr(target, "__dict__", {}))
+        for cls in type(target).__mro__:
+            slots = vars(cls).get("__slots__", ())
+            for name in (slots,) if isinstance(slots, str) else slots:
+                if name not in ("__dict__", "__weakref__") and hasattr(target, name):
+                    state[name] = getattr(target, name)
+        state.update(own_values(self))
+        return state
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in self.own_fields:
+            object.__setattr__(self, name, value)
+            return
+        if self._own is None:
+            object.__setattr__(self, "_own", fast_copy(self._shared))
+        setattr(self._own, name, value)
+
+    @property  # type: ignore[misc]
+    def __class__(self) -> type:
+        return type(self.__target())
+
+    def __str__(self) -> str:
+        method: Any = type(self.__target()).__str__
+        return str(method(self))
+
+    def __repr__(self) -> str:
+        method: Any = type(self.__target()).__repr__
+        return str(method(self))
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (restore_proxy, (self.own_fields, self.__target(), own_values(self)))
+
+
+# own fields the proxy has set; unset ones read through to the shared object
+def own_values(proxy: CopyOnWrite) -> dict[str, Any]:
+    values = {}
+    for name in type(proxy).own_fields:
+        try:
+            values[name] = object.__getattribute__(proxy, name)
+        except AttributeError:
+            pass
+    return values
+
+
+def restore_proxy(names: tuple[str, ...], shared: Any, own: dict[str, Any]) -> Any:
+    return CopyOnWrite.with_fields(*names)(shared, **own)
+
+
+# clones of a proxy share the same object until either of them writes
+def copy_proxy(proxy: CopyOnWrite, memo: dict[int, Any]) -> CopyOnWrite:
+    cls = type(proxy)
+    result = cls.__new__(cls)
+    own = proxy._own
+    shared = proxy._shared if own is None else fast_copy(own, memo)
+    object.__setattr__(result, "_shared", shared)
+    object.__setattr__(result, "_own", None)
+    for name, value in own_values(proxy).items():
+        object.__setattr__(result, name, fast_copy(value, memo))
+    return result
+
+
+CopyOnWrite.variants[()] = CopyOnWrite
+copiers[CopyOnWrite] = copy_proxy
+
+
+# flyweight: immutable objects interned by their field values, so equal objects are a
+# single shared object and equality is identity; the table holds them weakly, so unused
+# ones go away; values are keyed with their types, since e.g. 1 == True == 1.0 and they
+# must not share an instance
+class Flyweight:
+    __slots__ = ("__weakref__",)
+    fields: tuple[str, ...] = ()
+    instances: "WeakValueDictionary[tuple[tuple[type, Any], ...], Flyweight]"
+    hits: int
+    misses: int
+
+    # every subclass gets its own interning table and statistics
+    def __init_subclass__(cls) -> None:
+        super().__init_subclass__()
+        cls.instances = WeakValueDictionary()
+        cls.hits = 0
+        cls.misses = 0
+
+    def __new__(cls, *values: Any) -> Any:
+        key = tuple((type(v), v) for v in values)
+        instance = cls.instances.get(key)
+        if instance is not None:
+            cls.hits += 1
+            return instance
+
+        instance = super().__new__(cls)
+        for field, value in zip(cls.fields, values, strict=True):
+            object.__setattr__(instance, field, value)
+        cls.instances[key] = instance
+        cls.misses += 1
+        return instance
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (type(self), tuple(getattr(self, f) for f in self.fields))
+
+    # interned variant of this object with some fields changed
+    def replace(self, **changes: Any) -> Any:
+        return type(self)(*(changes.get(f, getattr(self, f)) for f in self.fields))
+
+
+# persistent prototype registry: prototypes are pickled into one file behind a small
+# index of name -> (offset, size); an opened store maps the file and only unpickles a
+# prototype on first use, so a cold start reads the index and the prototypes actually
+# requested
+class PrototypeStore(Mapping[str, Any]):
+    magic = b"PROT"
+    header = struct.Struct("<4sI")
+
+    @staticmethod
+    def save(path: str, prototypes: Mapping[str, Any]) -> None:
+        blobs = [pickle.dumps(p, pickle.HIGHEST_PROTOCOL) for p in prototypes.values()]
+        index: dict[str, tuple[int, int]] = {}
+        offset = 0
+        for name, blob in zip(prototypes, blobs):
+            index[name] = (offset, len(blob))
+            offset += len(blob)
+        index_blob = pickle.dumps(index, pickle.HIGHEST_PROTOCOL)
+        with open(path, "wb") as file:
+            file.write(
+                PrototypeStore.header.pack(PrototypeStore.magic, len(index_blob))
+            )
+            file.write(index_blob)
+            file.writelines(blobs)
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_size = self.header.unpack_from(self.data)
+        if magic != self.magic:
+            self.data.close()
+            raise ValueError(f"{path} is not a prototype store")
+        start, end = self.header.size, self.header.size + index_size
+        self.index: dict[str, tuple[int, int]] = pickle.loads(self.data[start:end])
+        self.base = end
+        self.loaded: dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        prototype = self.loaded.get(name)
+        if prototype is None:
+            offset, size = self.index[name]
+            start, end = self.base + offset, self.base + offset + size
+            prototype = self.loaded[name] = pickle.loads(self.data[start:end])
+        return prototype
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def close(self) -> None:
+        self.data.close()
+
+    def __enter__(self) -> "PrototypeStore":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
 
 
 class Address:
@@ -15,11 +344,22 @@ class Address:
         return f"{self.street}, {self.city}, {self.country}"
 
 
+class InternedAddress(Flyweight):
+    __slots__ = ("street", "city", "country")
+    fields = ("street", "city", "country")
+    street: str
+    city: str
+    country: str
+
+    def __str__(self) -> str:
+        return f"{self.street}, {self.city}, {self.country}"
+
+
 class Person:
     name: str
-    address: Address
+    address: Address | InternedAddress
 
-    def __init__(self, name: str, address: Address) -> None:
+    def __init__(self, name: str, address: Address | InternedAddress) -> None:
         self.name = name
         self.address = address
 
@@ -27,7 +367,7 @@ class Person:
         return f"{self.name} lives at {self.address}"
 
     def clone(self) -> "Person":
-        return copy.deepcopy(self)
+        return fast_copy(self)
 
 
 if __name__ == "__main__":
@@ -37,3 +377,12 @@ if __name__ == "__main__":
     jane.name = "Jane"
     jane.address.street = "256 George Berkeley"
     print(jane)
+
+    address = InternedAddress("123 George Berkeley", "London", "England")
+    jack = Person("Jack", address)
+    jill = Person("Jill", InternedAddress("123 George Berkeley", "London", "England"))
+    print(
+        jack.address is jill.address,
+        len(InternedAddress.instances),
+        InternedAddress.hits,
+    )